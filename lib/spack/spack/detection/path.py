@@ -102,15 +102,23 @@ def executables_in_path(path_hints: List[str]) -> Dict[str, str]:
     return path_to_dict(dedupe_paths(search_paths))
 
 
-def accept_elf(path, host_compat):
+def accept_elf(path, host_compat, cache: Optional[Dict[Tuple[int, int], bool]] = None):
     """Accept an ELF file if the header matches the given compat triplet. In case it's not an ELF
-    (e.g. static library, or some arbitrary file, fall back to is_readable_file)."""
+    (e.g. static library, or some arbitrary file, fall back to is_readable_file).
+
+    If ``cache`` is given, the result of the compat check is stored per (device, inode) pair, so
+    that files reachable through multiple symlinks or search paths are parsed only once."""
     # Fast path: assume libraries at least have .so in their basename.
     # Note: don't replace with splitext, because of libsmth.so.1.2.3 file names.
     if ".so" not in os.path.basename(path):
         return llnl.util.filesystem.is_readable_file(path)
     try:
-        return host_compat == elf_utils.get_elf_compat(path)
+        if cache is None:
+            return host_compat == elf_utils.get_elf_compat(path)
+        identifier = file_identifier(path)
+        if identifier not in cache:
+            cache[identifier] = host_compat == elf_utils.get_elf_compat(path)
+        return cache[identifier]
     except (OSError, elf_utils.ElfParsingError):
         return llnl.util.filesystem.is_readable_file(path)
 
@@ -164,7 +172,10 @@ def libraries_in_ld_and_system_library_path(
 
     try:
         host_compat = elf_utils.get_elf_compat(sys.executable)
-        accept = lambda path: accept_elf(path, host_compat)
+        # Libraries are typically reachable through a chain of symlinks, e.g. libfoo.so ->
+        # libfoo.so.1 -> libfoo.so.1.2.3, so cache the compat check per underlying file.
+        compat_cache: Dict[Tuple[int, int], bool] = {}
+        accept = lambda path: accept_elf(path, host_compat, compat_cache)
     except (OSError, elf_utils.ElfParsingError):
         accept = llnl.util.filesystem.is_readable_file
 
@@ -172,10 +183,14 @@ def libraries_in_ld_and_system_library_path(
     # Reverse order of search directories so that a lib in the first
     # search path entry overrides later entries
     for search_path in reversed(search_paths):
-        for lib in os.listdir(search_path):
-            lib_path = os.path.join(search_path, lib)
-            if accept(lib_path):
-                path_to_lib[lib_path] = lib
+        # DirEntry.path is computed once by scandir, no need to os.path.join every entry
+        with os.scandir(search_path) as entries:
+            for entry in entries:
+                # Subdirectories are never libraries, and d_type tells us so without a stat call
+                if entry.is_dir(follow_symlinks=False):
+                    continue
+                if accept(entry.path):
+                    path_to_lib[entry.path] = entry.name
     return path_to_lib
 
 
@@ -12,7 +12,7 @@
 import spack.bootstrap
 import spack.config
 import spack.relocate
-from spack.util.elf import ElfParsingError, parse_elf
+from spack.util.elf import ELF_CONSTANTS, ElfParsingError, parse_elf
 
 
 def is_shared_library_elf(filepath):
@@ -25,7 +25,13 @@ def is_shared_library_elf(filepath):
     no interpreter is typically the best indicator then."""
     try:
         with open(filepath, "rb") as f:
-            elf = parse_elf(f, interpreter=True, dynamic_section=True)
+            # Bail out early on anything without ELF magic, no need to raise in the parser.
+            if f.read(4) != ELF_CONSTANTS.MAGIC:
+                return False
+            f.seek(0)
+            # The presence of PT_INTERP is known from the program headers; there is no need to
+            # read the interpreter string itself.
+            elf = parse_elf(f, interpreter=False, dynamic_section=True)
             return elf.has_pt_dynamic and (elf.has_soname or not elf.has_pt_interp)
     except (IOError, OSError, ElfParsingError):
         return False
@@ -46,6 +52,9 @@ def __init__(self, exclude_list):
         # Set of (ino, dev) pairs (excluded by symlinks).
         self.excluded_through_symlink = set()
 
+        # Set of (ino, dev) pairs of hardlinked files that were already parsed.
+        self.visited = set()
+
     def visit_file(self, root, rel_path, depth):
         # Check if excluded
         basename = os.path.basename(rel_path)
@@ -60,6 +69,12 @@ def visit_file(self, root, rel_path, depth):
         if identifier in self.libraries or identifier in self.excluded_through_symlink:
             return
 
+        # Don't parse other hardlinks of a file that turned out not to be a shared library.
+        if s.st_nlink > 1:
+            if identifier in self.visited:
+                return
+            self.visited.add(identifier)
+
         # Register the file if it's a shared lib that needs to be patched.
         if is_shared_library_elf(filepath):
             self.libraries[identifier] = rel_path
@@ -84,8 +99,10 @@ def visit_symlinked_file(self, root, rel_path, depth):
 
     def before_visit_dir(self, root, rel_path, depth):
         # Allow skipping over directories. E.g. `<prefix>/lib/stubs` can be skipped by
-        # adding `"stubs"` to the exclude list.
-        return os.path.basename(rel_path) not in self.exclude_list
+        # adding `"stubs"` to the exclude list. Install metadata and man pages never contain
+        # shared libraries, so don't bother entering those.
+        basename = os.path.basename(rel_path)
+        return basename not in self.exclude_list and basename not in (".spack", "man")
 
     def before_visit_symlinked_dir(self, root, rel_path, depth):
         # Never enter symlinked dirs, since we don't want to leave the prefix, and
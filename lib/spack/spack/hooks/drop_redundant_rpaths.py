@@ -4,12 +4,13 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import os
-from typing import BinaryIO, Optional, Tuple
+import stat
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
 
 import llnl.util.tty as tty
 from llnl.util.filesystem import BaseDirectoryVisitor, visit_directory_tree
 
-from spack.util.elf import ElfParsingError, parse_elf
+from spack.util.elf import ELF_CONSTANTS, ElfParsingError, parse_elf
 
 
 def should_keep(path: bytes) -> bool:
@@ -18,15 +19,23 @@ def should_keep(path: bytes) -> bool:
     return path.startswith(b"$") or (os.path.isabs(path) and os.path.lexists(path))
 
 
-def _drop_redundant_rpaths(f: BinaryIO) -> Optional[Tuple[bytes, bytes]]:
+def _drop_redundant_rpaths(
+    f: BinaryIO, keep: Callable[[bytes], bool] = should_keep
+) -> Optional[Tuple[bytes, bytes]]:
     """Drop redundant entries from rpath.
 
     Args:
         f: File object to patch opened in r+b mode.
+        keep: Predicate that returns True iff an rpath entry should be kept.
 
     Returns:
         A tuple of the old and new rpath if the rpath was patched, None otherwise.
     """
+    # Cheaply reject non-ELF files, which are the majority of files in a prefix.
+    if f.read(4) != ELF_CONSTANTS.MAGIC:
+        return None
+    f.seek(0)
+
     try:
         elf = parse_elf(f, interpreter=False, dynamic_section=True)
     except ElfParsingError:
@@ -37,7 +46,7 @@ def _drop_redundant_rpaths(f: BinaryIO) -> Optional[Tuple[bytes, bytes]]:
         return None
 
     old_rpath_str = elf.dt_rpath_str
-    new_rpath_str = b":".join(p for p in old_rpath_str.split(b":") if should_keep(p))
+    new_rpath_str = b":".join(p for p in old_rpath_str.split(b":") if keep(p))
 
     # Nothing to write.
     if old_rpath_str == new_rpath_str:
@@ -59,18 +68,21 @@ def _drop_redundant_rpaths(f: BinaryIO) -> Optional[Tuple[bytes, bytes]]:
     return old_rpath_str, new_rpath_str
 
 
-def drop_redundant_rpaths(path: str) -> Optional[Tuple[bytes, bytes]]:
+def drop_redundant_rpaths(
+    path: str, keep: Callable[[bytes], bool] = should_keep
+) -> Optional[Tuple[bytes, bytes]]:
     """Drop redundant entries from rpath.
 
     Args:
         path: Path to a potential ELF file to patch.
+        keep: Predicate that returns True iff an rpath entry should be kept.
 
     Returns:
         A tuple of the old and new rpath if the rpath was patched, None otherwise.
     """
     try:
         with open(path, "r+b") as f:
-            return _drop_redundant_rpaths(f)
+            return _drop_redundant_rpaths(f, keep)
     except OSError:
         return None
 
@@ -82,20 +94,34 @@ def __init__(self):
         # Keep track of what hardlinked files we've already visited.
         self.visited = set()
 
+        # Most ELF files in a prefix have the same rpaths, so only check each of them once.
+        self.keep_rpath: Dict[bytes, bool] = {}
+
+    def _cached_should_keep(self, path: bytes) -> bool:
+        if path not in self.keep_rpath:
+            self.keep_rpath[path] = should_keep(path)
+        return self.keep_rpath[path]
+
     def visit_file(self, root, rel_path, depth):
         filepath = os.path.join(root, rel_path)
         s = os.lstat(filepath)
         identifier = (s.st_ino, s.st_dev)
 
+        # Don't bother opening non-executable files, unless they're named like a shared library.
+        is_executable = s.st_mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        if not is_executable and ".so" not in os.path.basename(rel_path):
+            return
+
         # We're hitting a hardlink or symlink of an excluded lib, no need to parse.
         if s.st_nlink > 1:
             if identifier in self.visited:
                 return
             self.visited.add(identifier)
 
-        result = drop_redundant_rpaths(filepath)
+        result = drop_redundant_rpaths(filepath, self._cached_should_keep)
 
-        if result is not None:
+        # Only format the message when it's actually shown.
+        if result is not None and tty.is_debug():
             old, new = result
             tty.debug(f"Patched rpath in {rel_path} from {old!r} to {new!r}")
 
@@ -103,8 +129,8 @@ def visit_symlinked_file(self, root, rel_path, depth):
         pass
 
     def before_visit_dir(self, root, rel_path, depth):
-        # Always enter dirs
-        return True
+        # Skip install metadata and man pages, which don't contain ELF files
+        return os.path.basename(rel_path) not in (".spack", "man")
 
     def before_visit_symlinked_dir(self, root, rel_path, depth):
         # Never enter symlinked dirs
@@ -52,3 +52,20 @@ def test_dedupe_paths(tmp_path):
     assert spack.detection.path.dedupe_paths([str(x), str(y), str(z)]) == [str(x), str(y)]
     assert spack.detection.path.dedupe_paths([str(z), str(y), str(x)]) == [str(x), str(y)]
     assert spack.detection.path.dedupe_paths([str(y), str(z), str(x)]) == [str(y), str(x)]
+
+
+def test_accept_elf_caches_by_file_identifier(tmp_path):
+    """Test that ``accept_elf`` parses a library reachable through symlinks only once"""
+    lib = tmp_path / "libfoo.so.1.2.3"
+    lib.write_bytes(b"\x7fELF\x02\x01\x01" + b"\x00" * 9 + b"\x03\x00\x3e\x00" + b"\x00" * 44)
+    (tmp_path / "libfoo.so.1").symlink_to(lib.name)
+    (tmp_path / "libfoo.so").symlink_to("libfoo.so.1")
+
+    host_compat = (True, True, 0x3E)
+    cache = {}
+    for name in ("libfoo.so", "libfoo.so.1", "libfoo.so.1.2.3"):
+        assert spack.detection.path.accept_elf(str(tmp_path / name), host_compat, cache)
+    assert len(cache) == 1
+
+    # A non-matching triplet with a fresh cache rejects the library
+    assert not spack.detection.path.accept_elf(str(lib), (False, True, 0x3), {})
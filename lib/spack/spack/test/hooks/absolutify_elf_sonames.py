@@ -10,6 +10,7 @@
 
 import llnl.util.filesystem as fs
 
+import spack.hooks.absolutify_elf_sonames
 import spack.platforms
 from spack.hooks.absolutify_elf_sonames import SharedLibrariesVisitor, find_and_patch_sonames
 from spack.util.executable import Executable
@@ -76,3 +77,23 @@ def test_shared_libraries_visitor(tmpdir):
     elf_2 = tmpdir.join("soname.so")
     assert ("--set-soname", elf_1, elf_1) in patchelf.calls
     assert ("--set-soname", elf_2, elf_2) in patchelf.calls
+
+
+def test_shared_libraries_visitor_parses_hardlinks_once(tmpdir, monkeypatch):
+    """Hardlinks of a file that is not a shared library should be parsed only once"""
+    parsed = []
+    monkeypatch.setattr(
+        spack.hooks.absolutify_elf_sonames,
+        "is_shared_library_elf",
+        lambda path: parsed.append(path) or False,
+    )
+
+    tmpdir.join("a").write("not an elf file")
+    os.link(str(tmpdir.join("a")), str(tmpdir.join("b")))
+    os.link(str(tmpdir.join("a")), str(tmpdir.join("c")))
+
+    visitor = SharedLibrariesVisitor(exclude_list=[])
+    fs.visit_directory_tree(str(tmpdir), visitor)
+
+    assert len(parsed) == 1
+    assert not visitor.get_shared_libraries_relative_paths()
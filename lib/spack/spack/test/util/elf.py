@@ -5,6 +5,8 @@
 
 
 import io
+import os
+import struct
 
 import pytest
 
@@ -13,7 +15,7 @@
 import spack.platforms
 import spack.util.elf as elf
 import spack.util.executable
-from spack.hooks.drop_redundant_rpaths import drop_redundant_rpaths
+from spack.hooks.drop_redundant_rpaths import ElfFilesWithRPathVisitor, drop_redundant_rpaths
 
 
 # note that our elf parser is platform independent... but I guess creating an elf file
@@ -109,6 +111,46 @@ def test_broken_elf():
         elf.parse_elf(io.BytesIO(b"\x7fELF\x01\x01" + (b"\x00" * 10) + b"\x09" + (b"\x00" * 35)))
 
 
+def minimal_elf_with_needed(pt_dynamic_p_filesz=48):
+    """Return a minimal 64-bit little-endian ET_DYN with a single DT_NEEDED entry:
+    ELF header (0), PT_LOAD and PT_DYNAMIC program headers (64), dynamic array (176),
+    string table (224) and a single SHT_STRTAB section header (240)."""
+    header = b"\x7fELF\x02\x01\x01" + b"\x00" * 9
+    header += struct.pack("<HHLQQQLHHHHHH", 3, 0x3E, 1, 0, 64, 240, 0, 64, 56, 2, 64, 1, 0)
+    pt_load = struct.pack("<LLQQQQQQ", 1, 0, 0, 0, 0, 304, 304, 0x1000)
+    pt_dynamic = struct.pack("<LLQQQQQQ", 2, 0, 176, 176, 176, pt_dynamic_p_filesz, 48, 8)
+    dynamic = struct.pack("<qQqQqQ", 1, 1, 5, 224, 0, 0)  # DT_NEEDED, DT_STRTAB, DT_NULL
+    strtab = b"\x00libfoo.so\x00".ljust(16, b"\x00")
+    section_header = struct.pack("<LLQQQQLLQQ", 0, 3, 0, 224, 224, 11, 0, 0, 1, 0)
+    return header + pt_load + pt_dynamic + dynamic + strtab + section_header
+
+
+@pytest.mark.parametrize("p_filesz", [48, 2**40, 2**64 - 16])
+def test_elf_parsing_large_pt_dynamic_filesz(p_filesz):
+    # p_filesz should not be trusted as a read size, the dynamic array ends at DT_NULL.
+    parsed = elf.parse_elf(io.BytesIO(minimal_elf_with_needed(p_filesz)), dynamic_section=True)
+    assert parsed.dt_needed_strs == [b"libfoo.so"]
+
+
+def test_elf_parsing_truncated_dynamic_section():
+    # The file ends in the middle of the DT_STRTAB entry, before DT_NULL
+    data = minimal_elf_with_needed()[:200]
+    with pytest.raises(elf.ElfParsingError, match="Malformed dynamic array entry"):
+        elf.parse_elf(io.BytesIO(data), dynamic_section=True)
+
+    # Same with an oversized p_filesz
+    data = minimal_elf_with_needed(2**40)[:200]
+    with pytest.raises(elf.ElfParsingError, match="Malformed dynamic array entry"):
+        elf.parse_elf(io.BytesIO(data), dynamic_section=True)
+
+
+def test_elf_parsing_truncated_section_headers():
+    # The file ends in the middle of the section header of the string table
+    data = minimal_elf_with_needed()[:272]
+    with pytest.raises(elf.ElfParsingError, match="Malformed section header"):
+        elf.parse_elf(io.BytesIO(data), dynamic_section=True)
+
+
 def test_parser_doesnt_deal_with_nonzero_offset():
     # Currently we don't have logic to parse ELF files at nonzero offsets in a file
     # This could be useful when e.g. modifying an ELF file inside a tarball or so,
@@ -134,6 +176,30 @@ def test_only_header():
     assert elf_64.is_little_endian
 
 
+def test_get_elf_compat(tmp_path):
+    # 64-bit little endian x86_64
+    lib = tmp_path / "le"
+    lib.write_bytes(b"\x7fELF\x02\x01\x01" + b"\x00" * 9 + b"\x03\x00\x3e\x00")
+    assert elf.get_elf_compat(str(lib)) == (True, True, 0x3E)
+
+    # 32-bit big endian PowerPC
+    lib = tmp_path / "be"
+    lib.write_bytes(b"\x7fELF\x01\x02\x01" + b"\x00" * 9 + b"\x00\x03\x00\x14")
+    assert elf.get_elf_compat(str(lib)) == (False, False, 0x14)
+
+    # Not an ELF file
+    lib = tmp_path / "script"
+    lib.write_bytes(b"#!/bin/sh\n")
+    with pytest.raises(elf.ElfParsingError, match="Not an ELF file"):
+        elf.get_elf_compat(str(lib))
+
+    # Truncated before e_machine
+    lib = tmp_path / "truncated"
+    lib.write_bytes(b"\x7fELF\x02\x01\x01" + b"\x00" * 9 + b"\x03\x00")
+    with pytest.raises(elf.ElfParsingError, match="ELF header malformed"):
+        elf.get_elf_compat(str(lib))
+
+
 @pytest.mark.requires_executables("gcc")
 @skip_unless_linux
 def test_elf_get_and_replace_rpaths_and_pt_interp(binary_with_rpaths):
@@ -202,3 +268,37 @@ def test_drop_redundant_rpath(tmpdir, binary_with_rpaths):
     new_rpaths = elf.get_rpaths(binary)
     assert set(existing_dirs).issubset(new_rpaths)
     assert set(non_existing_dirs).isdisjoint(new_rpaths)
+
+
+@pytest.mark.requires_executables("gcc")
+@skip_unless_linux
+def test_drop_redundant_rpath_visitor(tmpdir, binary_with_rpaths):
+    """Test that the visitor checks every rpath entry only once across files"""
+    existing, non_existing = str(tmpdir.ensure("c", dir=True)), str(tmpdir.join("a"))
+    prefix = tmpdir.ensure("prefix", dir=True)
+    binary = binary_with_rpaths(rpaths=[existing, non_existing])
+    for name in ("x", "y"):
+        fs.copy(str(binary), str(prefix.join(name)))
+
+    # Files that are neither executable nor named like a shared library are not visited
+    fs.copy(str(binary), str(prefix.join("data")))
+    os.chmod(str(prefix.join("data")), 0o644)
+    fs.copy(str(binary), str(prefix.join("libdata.so.1")))
+    os.chmod(str(prefix.join("libdata.so.1")), 0o644)
+
+    # Install metadata is not visited
+    metadata = prefix.ensure(".spack", dir=True).join("z")
+    fs.copy(str(binary), str(metadata))
+
+    visitor = ElfFilesWithRPathVisitor()
+    fs.visit_directory_tree(str(prefix), visitor)
+
+    assert visitor.keep_rpath[existing.encode()] is True
+    assert visitor.keep_rpath[non_existing.encode()] is False
+    for name in ("x", "y"):
+        new_rpaths = elf.get_rpaths(str(prefix.join(name)))
+        assert existing in new_rpaths
+        assert non_existing not in new_rpaths
+    assert non_existing in elf.get_rpaths(str(metadata))
+    assert non_existing in elf.get_rpaths(str(prefix.join("data")))
+    assert non_existing not in elf.get_rpaths(str(prefix.join("libdata.so.1")))
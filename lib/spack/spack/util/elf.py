@@ -4,9 +4,10 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import bisect
+import io
 import re
 import struct
-from struct import calcsize, unpack, unpack_from
+from struct import calcsize, iter_unpack, unpack, unpack_from
 from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple
 
 
@@ -266,12 +267,18 @@ def find_strtab_size_at_offset(f: BinaryIO, elf: ElfFile, offset: int) -> int:
     section_hdr_fmt = elf.byte_order + ("LLQQQQLLQQ" if elf.is_64_bit else "LLLLLLLLLL")
     section_hdr_size = calcsize(section_hdr_fmt)
     f.seek(elf.elf_hdr.e_shoff)
-    for _ in range(elf.elf_hdr.e_shnum):
-        data = read_exactly(f, section_hdr_size, "Malformed section header")
-        sh = SectionHeader(*unpack(section_hdr_fmt, data))
+
+    # Read all section headers in one go, and only unpack complete entries.
+    data = f.read(elf.elf_hdr.e_shnum * section_hdr_size)
+    complete = len(data) - len(data) % section_hdr_size
+    for fields in iter_unpack(section_hdr_fmt, data[:complete]):
+        sh = SectionHeader(*fields)
         if sh.sh_type == ELF_CONSTANTS.SHT_STRTAB and sh.sh_offset == offset:
             return sh.sh_size
 
+    if len(data) != elf.elf_hdr.e_shnum * section_hdr_size:
+        raise ElfParsingError("Malformed section header")
+
     raise ElfParsingError("Could not determine strtab size")
 
 
@@ -320,12 +327,15 @@ def parse_pt_dynamic(f: BinaryIO, elf: ElfFile) -> None:
     count_runpath = 0
     count_strtab = 0
 
+    # In case of broken ELF files, don't read beyond the advertized size. The dynamic array is
+    # read in one go, and only complete entries are unpacked. Don't trust p_filesz as a read
+    # size though, since it can be arbitrarily large: bound it by the size of the file.
+    dynamic_array_bytes = elf.pt_dynamic_p_filesz // dynamic_array_size * dynamic_array_size
+    file_size = f.seek(0, io.SEEK_END)
     f.seek(elf.pt_dynamic_p_offset)
-
-    # In case of broken ELF files, don't read beyond the advertized size.
-    for _ in range(elf.pt_dynamic_p_filesz // dynamic_array_size):
-        data = read_exactly(f, dynamic_array_size, "Malformed dynamic array entry")
-        tag, val = unpack(dynamic_array_fmt, data)
+    data = f.read(max(0, min(dynamic_array_bytes, file_size - elf.pt_dynamic_p_offset)))
+    complete = len(data) - len(data) % dynamic_array_size
+    for tag, val in iter_unpack(dynamic_array_fmt, data[:complete]):
         if tag == ELF_CONSTANTS.DT_NULL:
             break
         elif tag == ELF_CONSTANTS.DT_RPATH:
@@ -350,6 +360,10 @@ def parse_pt_dynamic(f: BinaryIO, elf: ElfFile) -> None:
             elf.has_soname = True
             elf.dt_soname_strtab_offset = val
         current_offset += dynamic_array_size
+    else:
+        # Reached the end of what could be read without finding DT_NULL.
+        if len(data) != dynamic_array_bytes:
+            raise ElfParsingError("Malformed dynamic array entry")
 
     # No rpath/runpath, that happens.
     if count_rpath == count_runpath == 0:
@@ -379,12 +393,18 @@ def parse_pt_dynamic(f: BinaryIO, elf: ElfFile) -> None:
         elf.dt_rpath_str = parse_c_string(string_table, elf.rpath_strtab_offset)
 
 
-def parse_header(f: BinaryIO, elf: ElfFile) -> None:
-    # Read the 32/64 bit class independent part of the header and validate
-    e_ident = f.read(16)
+def parse_e_ident(e_ident: bytes) -> Tuple[bool, bool]:
+    """
+    Validate the 32/64 bit class independent part of the ELF header
 
+    Arguments:
+        e_ident: at least the first 16 bytes of the file
+
+    Returns:
+        Tuple[bool, bool]: whether the file is 64-bit and whether it is little endian
+    """
     # Require ELF magic bytes.
-    if len(e_ident) != 16 or e_ident[:4] != ELF_CONSTANTS.MAGIC:
+    if len(e_ident) < 16 or e_ident[:4] != ELF_CONSTANTS.MAGIC:
         raise ElfParsingError("Not an ELF file")
 
     # Defensively require a valid class and data.
@@ -396,8 +416,12 @@ def parse_header(f: BinaryIO, elf: ElfFile) -> None:
     if e_ident_data not in (ELF_CONSTANTS.DATA2LSB, ELF_CONSTANTS.DATA2MSB):
         raise ElfParsingError("Invalid data type")
 
-    elf.is_64_bit = e_ident_class == ELF_CONSTANTS.CLASS64
-    elf.is_little_endian = e_ident_data == ELF_CONSTANTS.DATA2LSB
+    return e_ident_class == ELF_CONSTANTS.CLASS64, e_ident_data == ELF_CONSTANTS.DATA2LSB
+
+
+def parse_header(f: BinaryIO, elf: ElfFile) -> None:
+    # Read the 32/64 bit class independent part of the header and validate
+    elf.is_64_bit, elf.is_little_endian = parse_e_ident(f.read(16))
 
     # Set up byte order and types for unpacking
     elf.byte_order = "<" if elf.is_little_endian else ">"
@@ -678,9 +702,15 @@ def get_elf_compat(path):
     two ELF files are compatible."""
     # On ELF platforms supporting, we try to be a bit smarter when it comes to shared
     # libraries, by dropping those that are not host compatible.
-    with open(path, "rb") as f:
-        elf = parse_elf(f, only_header=True)
-        return (elf.is_64_bit, elf.is_little_endian, elf.elf_hdr.e_machine)
+    # Everything we need is in e_ident and e_machine, which are at the same offsets for 32 and
+    # 64-bit files, so do a single unbuffered read of 20 bytes instead of parsing the header.
+    with open(path, "rb", buffering=0) as f:
+        data = f.read(20)
+    is_64_bit, is_little_endian = parse_e_ident(data)
+    if len(data) != 20:
+        raise ElfParsingError("ELF header malformed")
+    (e_machine,) = unpack_from("<H" if is_little_endian else ">H", data, 18)
+    return (is_64_bit, is_little_endian, e_machine)
 
 
 class ElfCStringUpdatesFailed(Exception):